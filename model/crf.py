@@ -73,8 +73,8 @@ class CRF_S(nn.Module):
             output from crf layer (batch_size, seq_len, tag_size, tag_size)
         """
         
-        ins_num = feats.size(0)
-        scores = self.hidden2tag(feats)
+        scores = self.hidden2tag(feats).view(-1, self.tagset_size)
+        ins_num = scores.size(0)
         crf_scores = scores.view(-1, self.tagset_size, 1).expand(ins_num, self.tagset_size, self.tagset_size) + self.transitions.view(1, self.tagset_size, self.tagset_size).expand(ins_num, self.tagset_size, self.tagset_size)
 
         return crf_scores
@@ -104,11 +104,11 @@ class CRFRepack:
         """
         
         if self.if_cuda:
-            fea_v = autograd.Variable(feature.transpose(0, 1)).cuda()
-            tg_v = autograd.Variable(target.transpose(0, 1)).unsqueeze(2).cuda()
-            mask_v = autograd.Variable(mask.transpose(0, 1)).cuda()
+            fea_v = autograd.Variable(feature.transpose(0, 1)).cuda().contiguous()
+            tg_v = autograd.Variable(target.transpose(0, 1)).cuda().contiguous().unsqueeze(2)
+            mask_v = autograd.Variable(mask.transpose(0, 1)).cuda().contiguous()
         else:
-            fea_v = autograd.Variable(feature.transpose(0, 1))
+            fea_v = autograd.Variable(feature.transpose(0, 1)).contiguous()
             tg_v = autograd.Variable(target.transpose(0, 1)).contiguous().unsqueeze(2)
             mask_v = autograd.Variable(mask.transpose(0, 1)).contiguous()
         return fea_v, tg_v, mask_v
@@ -124,11 +124,11 @@ class CRFRepack:
             feature (Seq_len, Batch_size), target (Seq_len * Batch_size), current (Seq_len * Batch_size, 1, 1)
         """
         if self.if_cuda:
-            fea_v = autograd.Variable(feature.transpose(0, 1)).cuda()
-            ts_v = autograd.Variable(target.transpose(0, 1)).cuda().view(-1)
-            cs_v = autograd.Variable(current.transpose(0, 1)).cuda().view(-1, 1, 1)
+            fea_v = autograd.Variable(feature.transpose(0, 1)).cuda().contiguous()
+            ts_v = autograd.Variable(target.transpose(0, 1)).cuda().contiguous().view(-1)
+            cs_v = autograd.Variable(current.transpose(0, 1)).cuda().contiguous().view(-1, 1, 1)
         else:
-            fea_v = autograd.Variable(feature.transpose(0, 1))
+            fea_v = autograd.Variable(feature.transpose(0, 1)).contiguous()
             ts_v = autograd.Variable(target.transpose(0, 1)).contiguous().view(-1)
             cs_v = autograd.Variable(current.transpose(0, 1)).contiguous().view(-1, 1, 1)
         return fea_v, ts_v, cs_v
@@ -178,21 +178,21 @@ class CRFRepack_WC:
         mlen = mlen.squeeze()
         ocl = b_f.size(1)
         if self.if_cuda:
-            f_f = autograd.Variable(f_f[:, 0:mlen[0]].transpose(0, 1)).cuda()
-            f_p = autograd.Variable(f_p[:, 0:mlen[1]].transpose(0, 1)).cuda()
-            b_f = autograd.Variable(b_f[:, -mlen[0]:].transpose(0, 1)).cuda()
-            b_p = autograd.Variable((b_p[:, 0:mlen[1]] - ocl + mlen[0]).transpose(0, 1)).cuda()
-            w_f = autograd.Variable(w_f[:, 0:mlen[1]].transpose(0, 1)).cuda()
-            tg_v = autograd.Variable(target[:, 0:mlen[1]].transpose(0, 1)).unsqueeze(2).cuda()
-            mask_v = autograd.Variable(mask[:, 0:mlen[1]].transpose(0, 1)).cuda()
+            f_f = autograd.Variable(f_f[:, 0:mlen[0]].transpose(0, 1)).cuda().contiguous()
+            f_p = autograd.Variable(f_p[:, 0:mlen[1]].transpose(0, 1)).cuda().contiguous()
+            b_f = autograd.Variable(b_f[:, -mlen[0]:].transpose(0, 1)).cuda().contiguous()
+            b_p = autograd.Variable((b_p[:, 0:mlen[1]] - ocl + mlen[0]).transpose(0, 1)).cuda().contiguous()
+            w_f = autograd.Variable(w_f[:, 0:mlen[1]].transpose(0, 1)).cuda().contiguous()
+            tg_v = autograd.Variable(target[:, 0:mlen[1]].transpose(0, 1)).cuda().contiguous().unsqueeze(2)
+            mask_v = autograd.Variable(mask[:, 0:mlen[1]].transpose(0, 1)).cuda().contiguous()
         else:
-            f_f = autograd.Variable(f_f[:, 0:mlen[0]].transpose(0, 1))
-            f_p = autograd.Variable(f_p[:, 0:mlen[1]].transpose(0, 1))
-            b_f = autograd.Variable(b_f[:, -mlen[0]:].transpose(0, 1))
-            b_p = autograd.Variable((b_p[:, 0:mlen[1]] - ocl + mlen[0]).transpose(0, 1))
-            w_f = autograd.Variable(w_f[:, 0:mlen[1]].transpose(0, 1))
-            tg_v = autograd.Variable(target[:, 0:mlen[1]].transpose(0, 1)).unsqueeze(2)
-            mask_v = autograd.Variable(mask[:, 0:mlen[1]].transpose(0, 1))
+            f_f = autograd.Variable(f_f[:, 0:mlen[0]].transpose(0, 1)).contiguous()
+            f_p = autograd.Variable(f_p[:, 0:mlen[1]].transpose(0, 1)).contiguous()
+            b_f = autograd.Variable(b_f[:, -mlen[0]:].transpose(0, 1)).contiguous()
+            b_p = autograd.Variable((b_p[:, 0:mlen[1]] - ocl + mlen[0]).transpose(0, 1)).contiguous()
+            w_f = autograd.Variable(w_f[:, 0:mlen[1]].transpose(0, 1)).contiguous()
+            tg_v = autograd.Variable(target[:, 0:mlen[1]].transpose(0, 1)).contiguous().unsqueeze(2)
+            mask_v = autograd.Variable(mask[:, 0:mlen[1]].transpose(0, 1)).contiguous()
         return f_f, f_p, b_f, b_p, w_f, tg_v, mask_v
 
     def convert_for_eval(self, target):
@@ -357,7 +357,7 @@ class CRFDecode_vb():
         seq_len = scores.size(0)
         bat_size = scores.size(1)
 
-        mask = 1 - mask
+        mask = (mask == 0)
         decode_idx = torch.LongTensor(seq_len-1, bat_size)
 
         # calculate forward score and checkpoint
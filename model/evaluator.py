@@ -164,7 +164,8 @@ class eval_w(eval_batch):
                 
         for feature, tg, mask in itertools.chain.from_iterable(dataset_loader):
             fea_v, _, mask_v = self.packer.repack_vb(feature, tg, mask)
-            scores, _ = ner_model(fea_v)
+            with torch.no_grad():
+                scores, _ = ner_model(fea_v)
             decoded = self.decoder.decode(scores.data, mask_v.data)
 
             self.eval_b(decoded, tg)
@@ -206,7 +207,8 @@ class eval_wc(eval_batch):
 
         for f_f, f_p, b_f, b_p, w_f, tg, mask_v, len_v in itertools.chain.from_iterable(dataset_loader):
             f_f, f_p, b_f, b_p, w_f, _, mask_v = self.packer.repack_vb(f_f, f_p, b_f, b_p, w_f, tg, mask_v, len_v)
-            scores = ner_model(f_f, f_p, b_f, b_p, w_f, file_no)
+            with torch.no_grad():
+                scores = ner_model(f_f, f_p, b_f, b_p, w_f, file_no)
             decoded = self.decoder.decode(scores.data, mask_v.data)
 
             self.eval_b(decoded, tg)
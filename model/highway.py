@@ -31,9 +31,10 @@ class hw(nn.Module):
             self.trans.append(tmptrans)
             self.gate.append(tmpgate)
 
+    @torch.jit.ignore
     def rand_init(self):
         """
-        random initialization
+        random initialization, also callable after torch.jit.script
         """
         for i in range(self.num_layers):
             utils.init_linear(self.trans[i])
@@ -48,16 +49,13 @@ class hw(nn.Module):
         return:
             output tensor (ins_num, hidden_dim)
         """
-        
-        
-        g = nn.functional.sigmoid(self.gate[0](x))
-        h = nn.functional.relu(self.trans[0](x))
-        x = g * h + (1 - g) * x
-
-        for i in range(1, self.num_layers):
-            x = self.dropout(x)
-            g = nn.functional.sigmoid(self.gate[i](x))
-            h = nn.functional.relu(self.trans[i](x))
+
+        # iterate the module lists directly so the loop can be compiled by torch.jit.script
+        for i, (trans, gate) in enumerate(zip(self.trans, self.gate)):
+            if i > 0:
+                x = self.dropout(x)
+            g = torch.sigmoid(gate(x))
+            h = nn.functional.relu(trans(x))
             x = g * h + (1 - g) * x
 
         return x
\ No newline at end of file
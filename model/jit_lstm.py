@@ -0,0 +1,39 @@
+"""
+.. module:: jit_lstm
+    :synopsis: TorchScript-compatible lstm
+"""
+
+from typing import Tuple
+
+import torch
+import torch.nn as nn
+
+
+class ScriptLSTM(nn.LSTM):
+    """LSTM layer which can be compiled with torch.jit.script. The stock nn.LSTM.forward is overloaded (tensor / packed sequence), which TorchScript cannot compile into a single forward; this version only accepts padded tensors and always starts from zero hidden states.
+
+    It keeps the parameter names of nn.LSTM, so checkpoints are interchangeable with nn.LSTM.
+
+    args:
+        same as nn.LSTM
+    """
+
+    def forward(self, input: torch.Tensor) -> Tuple[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]:
+        """
+        args:
+            input (seq_len, batch_size, input_size) : input sequence
+        return:
+            output (seq_len, batch_size, num_directions * hidden_size), (h_n, c_n)
+        """
+        num_directions = 2 if self.bidirectional else 1
+        batch_size = input.size(0) if self.batch_first else input.size(1)
+        zeros = torch.zeros(self.num_layers * num_directions, batch_size, self.hidden_size, dtype=input.dtype, device=input.device)
+        result = torch._VF.lstm(input, (zeros, zeros), self._flat_weights, self.bias, self.num_layers, self.dropout, self.training, self.bidirectional, self.batch_first)
+        return result[0], (result[1], result[2])
+
+    @torch.jit.ignore
+    def flatten_parameters(self):
+        """
+        compact weights into one contiguous chunk for cuDNN, also callable on the scripted module
+        """
+        nn.LSTM.flatten_parameters(self)
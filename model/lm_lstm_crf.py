@@ -10,9 +10,11 @@ import torch.autograd as autograd
 import torch.nn as nn
 import torch.optim as optim
 import numpy as np
+import copy
 import model.crf as crf
 import model.utils as utils
 import model.highway as highway
+import model.jit_lstm as jit_lstm
 
 class LM_LSTM_CRF(nn.Module):
     """LM_LSTM_CRF model
@@ -46,13 +48,16 @@ class LM_LSTM_CRF(nn.Module):
         self.if_highway = if_highway
 
         self.char_embeds = nn.Embedding(char_size, char_dim)
-        self.forw_char_lstm = nn.LSTM(char_dim, char_hidden_dim, num_layers=char_rnn_layers, bidirectional=False, dropout=dropout_ratio)
-        self.back_char_lstm = nn.LSTM(char_dim, char_hidden_dim, num_layers=char_rnn_layers, bidirectional=False, dropout=dropout_ratio)
+        self.forw_char_lstm = jit_lstm.ScriptLSTM(char_dim, char_hidden_dim, num_layers=char_rnn_layers, bidirectional=False, dropout=dropout_ratio)
+        self.back_char_lstm = jit_lstm.ScriptLSTM(char_dim, char_hidden_dim, num_layers=char_rnn_layers, bidirectional=False, dropout=dropout_ratio)
+        self.forw_char_lstm = torch.jit.script(self.forw_char_lstm)
+        self.back_char_lstm = torch.jit.script(self.back_char_lstm)
         self.char_rnn_layers = char_rnn_layers
 
         self.word_embeds = nn.Embedding(vocab_size, embedding_dim)
 
-        self.word_lstm = nn.LSTM(embedding_dim + char_hidden_dim * 2, word_hidden_dim // 2, num_layers=word_rnn_layers, bidirectional=True, dropout=dropout_ratio)
+        self.word_lstm = jit_lstm.ScriptLSTM(embedding_dim + char_hidden_dim * 2, word_hidden_dim // 2, num_layers=word_rnn_layers, bidirectional=True, dropout=dropout_ratio)
+        self.word_lstm = torch.jit.script(self.word_lstm)
 
         self.word_rnn_layers = word_rnn_layers
 
@@ -72,6 +77,11 @@ class LM_LSTM_CRF(nn.Module):
             self.forw2word = highway.hw(char_hidden_dim, num_layers=highway_layers, dropout_ratio=dropout_ratio)
             self.back2word = highway.hw(char_hidden_dim, num_layers=highway_layers, dropout_ratio=dropout_ratio)
             self.fb2char = highway.hw(2 * char_hidden_dim, num_layers=highway_layers, dropout_ratio=dropout_ratio)
+            self.forw2char = torch.jit.script(self.forw2char)
+            self.back2char = torch.jit.script(self.back2char)
+            self.forw2word = torch.jit.script(self.forw2word)
+            self.back2word = torch.jit.script(self.back2word)
+            self.fb2char = torch.jit.script(self.fb2char)
 
         self.char_pre_train_out = nn.Linear(char_hidden_dim, char_size)
         self.word_pre_train_out = nn.Linear(char_hidden_dim, in_doc_words)
@@ -79,12 +89,40 @@ class LM_LSTM_CRF(nn.Module):
         self.batch_size = 1
         self.word_seq_length = 1
 
+        self.streams = dict()
+        self.batch_idx_cache = dict()
+        self.workspace = dict()
+
+        self.use_amp = False
+        self.amp_dtype = torch.float16
+        self.use_streams = False
+
     def set_batch_size(self, bsize):
         """
         set batch size
         """
         self.batch_size = bsize
 
+    def set_amp(self, use_amp, amp_dtype=torch.float16):
+        """
+        enable or disable mixed precision (autocast) in forward
+
+        args:
+            use_amp: use mixed precision or not
+            amp_dtype: torch.float16 or torch.bfloat16
+        """
+        self.use_amp = use_amp
+        self.amp_dtype = amp_dtype
+
+    def set_streams(self, use_streams):
+        """
+        enable or disable running independent parts of forward on side cuda streams, off by default as it has not been validated on gpu yet
+
+        args:
+            use_streams: use side cuda streams or not, ignored for cpu inputs
+        """
+        self.use_streams = use_streams
+
     def set_batch_seq_size(self, sentence):
         """
         set batch size and sequence length
@@ -93,6 +131,119 @@ class LM_LSTM_CRF(nn.Module):
         self.word_seq_length = tmp[0]
         self.batch_size = tmp[1]
 
+    def flatten_parameters(self):
+        """
+        keep lstm weights in one contiguous chunk for cuDNN
+        """
+        for lstm in (self.forw_char_lstm, self.back_char_lstm, self.word_lstm):
+            if hasattr(lstm, 'flatten_parameters'):
+                lstm.flatten_parameters()
+
+    def _apply(self, fn, *args, **kwargs):
+        """
+        re-flatten lstm weights after they are moved (e.g., by cuda()), as scripted lstms do not do it themselves
+        """
+        module = super(LM_LSTM_CRF, self)._apply(fn, *args, **kwargs)
+        self.flatten_parameters()
+        return module
+
+    def jit_optimize(self):
+        """
+        freeze and optimize the scripted lstms and highway layers for inference, only works in eval mode
+
+        the optimized modules are no longer trainable and their weights are dropped from state_dict, so call it after loading the checkpoint
+        """
+        if self.training:
+            return
+        names = ['forw_char_lstm', 'back_char_lstm', 'word_lstm']
+        if self.if_highway:
+            names += ['forw2char', 'back2char', 'forw2word', 'back2word', 'fb2char']
+        for name in names:
+            module = getattr(self, name)
+            #skip modules which are not scripted, e.g., the word-level lstm after inference_mode()
+            if isinstance(module, torch.jit.ScriptModule):
+                setattr(self, name, torch.jit.optimize_for_inference(module))
+
+    def inference_mode(self):
+        """
+        int8 dynamic quantization of the word-level lstm, the highway layers, the crf and the language model linear layers, only for cpu inference; the char-level lstms are kept in fp32
+
+        the scripted word-level lstm and highway layers are first converted back to nn.LSTM / highway.hw (with the same parameters) so that quantize_dynamic can swap them, call it before jit_optimize()
+
+        return:
+            quantized copy of the model, in eval mode
+        """
+        model = copy.deepcopy(self)
+        word_lstm = model.word_lstm
+        float_lstm = nn.LSTM(word_lstm.input_size, word_lstm.hidden_size, num_layers=word_lstm.num_layers, bias=word_lstm.bias, batch_first=word_lstm.batch_first, dropout=word_lstm.dropout, bidirectional=word_lstm.bidirectional)
+        float_lstm.load_state_dict(word_lstm.state_dict())
+        model.word_lstm = float_lstm
+        if model.if_highway:
+            for name in ['forw2char', 'back2char', 'forw2word', 'back2word', 'fb2char']:
+                scripted_hw = getattr(model, name)
+                float_hw = highway.hw(scripted_hw.size, num_layers=scripted_hw.num_layers, dropout_ratio=scripted_hw.dropout.p)
+                float_hw.load_state_dict(scripted_hw.state_dict())
+                setattr(model, name, float_hw)
+        model.eval()
+        return torch.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    def get_batch_idx(self, position):
+        """
+        get the batch index paired with position to select char-level states
+
+        one index per device and batch size is cached, it only grows with the longest word_seq_len seen and shorter batches slice it
+
+        args:
+            position (word_seq_len, batch_size): position of blank space in char-level representation of sentence
+
+        return:
+            batch index (word_seq_len, batch_size)
+        """
+        word_seq_len, batch_size = position.size()
+        key = (position.device, batch_size)
+        batch_idx = self.batch_idx_cache.get(key)
+        if batch_idx is None or batch_idx.size(0) < word_seq_len:
+            batch_idx = torch.arange(batch_size, device=position.device).unsqueeze(0).expand(word_seq_len, -1)
+            self.batch_idx_cache[key] = batch_idx
+        return batch_idx[:word_seq_len]
+
+    def get_workspace(self, size, dtype, device):
+        """
+        get a buffer of the given size to write intermediate results into
+
+        it is a view of one flat buffer per device and dtype, which only grows with the largest size seen, so batches of any shape reuse it
+        only use it when autograd is disabled, as the next forward pass overwrites its content
+        """
+        numel = int(np.prod(size))
+        key = (device, dtype)
+        buffer = self.workspace.get(key)
+        if buffer is None or buffer.numel() < numel:
+            buffer = torch.empty(numel, dtype=dtype, device=device)
+            self.workspace[key] = buffer
+        return buffer[:numel].view(size)
+
+    def release_cache(self):
+        """
+        drop the cached workspace buffers and batch indexes, and return the unused cached cuda memory to the device (e.g., after a validation pass)
+        """
+        self.workspace.clear()
+        self.batch_idx_cache.clear()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def get_stream(self, name, device):
+        """
+        lazily create the side cuda streams used in forward, one per name and device
+
+        args:
+            name: 'forw_char', 'back_char' (the two char-level lstms) or 'word' (word embedding)
+            device: cuda device
+        """
+        key = (name, device)
+        if key not in self.streams:
+            self.streams[key] = torch.cuda.Stream(device=device)
+        return self.streams[key]
+
     def rand_init_embedding(self):
         """
         random initialize char-level embedding
@@ -131,6 +282,7 @@ class LM_LSTM_CRF(nn.Module):
         utils.init_lstm(self.forw_char_lstm)
         utils.init_lstm(self.back_char_lstm)
         utils.init_lstm(self.word_lstm)
+        self.flatten_parameters()
         utils.init_linear(self.char_pre_train_out)
         utils.init_linear(self.word_pre_train_out)
         for crf in self.crflist:
@@ -153,9 +305,7 @@ class LM_LSTM_CRF(nn.Module):
         d_embeds = self.dropout(embeds)
         lstm_out, hidden = self.forw_char_lstm(d_embeds)
 
-        tmpsize = position.size()
-        position = position.unsqueeze(2).expand(tmpsize[0], tmpsize[1], self.char_hidden_dim)
-        select_lstm_out = torch.gather(lstm_out, 0, position)
+        select_lstm_out = lstm_out[position, self.get_batch_idx(position)]
         d_lstm_out = self.dropout(select_lstm_out).view(-1, self.char_hidden_dim)
 
         if self.if_highway:
@@ -183,9 +333,7 @@ class LM_LSTM_CRF(nn.Module):
         d_embeds = self.dropout(embeds)
         lstm_out, hidden = self.back_char_lstm(d_embeds)
         
-        tmpsize = position.size()
-        position = position.unsqueeze(2).expand(tmpsize[0], tmpsize[1], self.char_hidden_dim)
-        select_lstm_out = torch.gather(lstm_out, 0, position)
+        select_lstm_out = lstm_out[position, self.get_batch_idx(position)]
         d_lstm_out = self.dropout(select_lstm_out).view(-1, self.char_hidden_dim)
 
         if self.if_highway:
@@ -213,46 +361,87 @@ class LM_LSTM_CRF(nn.Module):
 
         self.set_batch_seq_size(forw_position)
 
-        #embedding layer
-        forw_emb = self.char_embeds(forw_sentence)
-        back_emb = self.char_embeds(back_sentence)
-
-        #dropout
-        d_f_emb = self.dropout(forw_emb)
-        d_b_emb = self.dropout(back_emb)
-
-        #forward the whole sequence
-        forw_lstm_out, _ = self.forw_char_lstm(d_f_emb)#seq_len_char * batch * char_hidden_dim
-
-        back_lstm_out, _ = self.back_char_lstm(d_b_emb)#seq_len_char * batch * char_hidden_dim
-
-        #select predict point
-        forw_position = forw_position.unsqueeze(2).expand(self.word_seq_length, self.batch_size, self.char_hidden_dim)
-        select_forw_lstm_out = torch.gather(forw_lstm_out, 0, forw_position)
+        #mixed precision for the embedding / lstm / highway backbone, the crf stays in fp32
+        with torch.autocast(device_type=forw_sentence.device.type, dtype=self.amp_dtype, enabled=self.use_amp):
+            #word, looked up on a side stream so that it overlaps with the char-level pipeline below
+            if self.use_streams and word_seq.is_cuda:
+                word_stream = self.get_stream('word', word_seq.device)
+                word_stream.wait_stream(torch.cuda.current_stream(word_seq.device))
+                with torch.cuda.stream(word_stream):
+                    word_emb = self.word_embeds(word_seq)
+                    d_word_emb = self.dropout(word_emb)
+                word_seq.record_stream(word_stream)
+            else:
+                word_emb = self.word_embeds(word_seq)
+                d_word_emb = self.dropout(word_emb)
+
+            #embedding layer & dropout
+            if forw_sentence.size() == back_sentence.size():
+                #one lookup for both directions, stacked on a leading dim so each half stays contiguous
+                d_fb_emb = self.dropout(self.char_embeds(torch.stack((forw_sentence, back_sentence))))
+                d_f_emb = d_fb_emb[0]
+                d_b_emb = d_fb_emb[1]
+            else:
+                d_f_emb = self.dropout(self.char_embeds(forw_sentence))
+                d_b_emb = self.dropout(self.char_embeds(back_sentence))
+
+            #forward the whole sequence
+            if self.use_streams and d_f_emb.is_cuda:
+                #the two char lstms are independent, overlap them on separate streams
+                forw_stream = self.get_stream('forw_char', d_f_emb.device)
+                back_stream = self.get_stream('back_char', d_f_emb.device)
+                current_stream = torch.cuda.current_stream(d_f_emb.device)
+                forw_stream.wait_stream(current_stream)
+                back_stream.wait_stream(current_stream)
+                with torch.cuda.stream(forw_stream):
+                    forw_lstm_out, _ = self.forw_char_lstm(d_f_emb)#seq_len_char * batch * char_hidden_dim
+                with torch.cuda.stream(back_stream):
+                    back_lstm_out, _ = self.back_char_lstm(d_b_emb)#seq_len_char * batch * char_hidden_dim
+                current_stream.wait_stream(forw_stream)
+                current_stream.wait_stream(back_stream)
+                #keep the caching allocator from recycling these blocks while another stream still uses them
+                d_f_emb.record_stream(forw_stream)
+                d_b_emb.record_stream(back_stream)
+                forw_lstm_out.record_stream(current_stream)
+                back_lstm_out.record_stream(current_stream)
+            else:
+                forw_lstm_out, _ = self.forw_char_lstm(d_f_emb)#seq_len_char * batch * char_hidden_dim
 
-        back_position = back_position.unsqueeze(2).expand(self.word_seq_length, self.batch_size, self.char_hidden_dim)
-        select_back_lstm_out = torch.gather(back_lstm_out, 0, back_position)
+                back_lstm_out, _ = self.back_char_lstm(d_b_emb)#seq_len_char * batch * char_hidden_dim
 
-        fb_lstm_out = self.dropout(torch.cat((select_forw_lstm_out, select_back_lstm_out), dim=2))
-        if self.if_highway:
-            char_out = self.fb2char(fb_lstm_out)
-            d_char_out = self.dropout(char_out)
-        else:
-            d_char_out = fb_lstm_out
+            #select predict point
+            batch_idx = self.get_batch_idx(forw_position)
+            select_forw_lstm_out = forw_lstm_out[forw_position, batch_idx]
 
-        #word
-        word_emb = self.word_embeds(word_seq)
-        d_word_emb = self.dropout(word_emb)
+            select_back_lstm_out = back_lstm_out[back_position, batch_idx]
 
-        #combine
-        word_input = torch.cat((d_word_emb, d_char_out), dim = 2)
+            #dropout each direction before concatenating, saves one pass over the concatenated tensor
+            d_select_forw_lstm_out = self.dropout(select_forw_lstm_out)
+            d_select_back_lstm_out = self.dropout(select_back_lstm_out)
+            fb_lstm_out = torch.cat((d_select_forw_lstm_out, d_select_back_lstm_out), dim=2)
+            if self.if_highway:
+                char_out = self.fb2char(fb_lstm_out)
+                d_char_out = self.dropout(char_out)
+            else:
+                d_char_out = fb_lstm_out
+
+            #combine
+            if self.use_streams and word_seq.is_cuda:
+                torch.cuda.current_stream(word_seq.device).wait_stream(word_stream)
+                d_word_emb.record_stream(torch.cuda.current_stream(word_seq.device))
+            if torch.is_grad_enabled():
+                word_input = torch.cat((d_word_emb, d_char_out), dim = 2)
+            else:
+                #no autograd graph keeps word_input alive, so write it into a reused buffer
+                workspace = self.get_workspace((self.word_seq_length, self.batch_size, d_word_emb.size(2) + d_char_out.size(2)), torch.result_type(d_word_emb, d_char_out), d_word_emb.device)
+                word_input = torch.cat((d_word_emb, d_char_out), dim = 2, out = workspace)
 
-        #word level lstm
-        lstm_out, _ = self.word_lstm(word_input)
-        d_lstm_out = self.dropout(lstm_out)
+            #word level lstm
+            lstm_out, _ = self.word_lstm(word_input)
+            d_lstm_out = self.dropout(lstm_out)
 
         #convert to crf
-        crf_out = self.crflist[file_no](d_lstm_out)
+        crf_out = self.crflist[file_no](d_lstm_out.float())
         crf_out = crf_out.view(self.word_seq_length, self.batch_size, self.tagset_size, self.tagset_size)
         
         return crf_out
\ No newline at end of file
@@ -187,17 +187,18 @@ class predict_w(predict):
         features = encode_safe(features, self.f_map, self.f_map['<unk>'])
         f_len = max(map(lambda t: len(t) + 1, features))
 
-        masks = torch.ByteTensor(list(map(lambda t: [1] * (len(t) + 1) + [0] * (f_len - len(t) - 1), features)))
+        masks = get_non_pad_mask([len(t) + 1 for t in features], f_len)
         word_features = torch.LongTensor(list(map(lambda t: t + [self.pad_word] * (f_len - len(t)), features)))
 
         if self.if_cuda:
-            fea_v = autograd.Variable(word_features.transpose(0, 1)).cuda()
-            mask_v = masks.transpose(0, 1).cuda()
+            fea_v = autograd.Variable(word_features.transpose(0, 1)).cuda().contiguous()
+            mask_v = masks.transpose(0, 1).cuda().contiguous()
         else:
-            fea_v = autograd.Variable(word_features.transpose(0, 1))
+            fea_v = autograd.Variable(word_features.transpose(0, 1)).contiguous()
             mask_v = masks.transpose(0, 1).contiguous()
 
-        scores, _ = ner_model(fea_v)
+        with torch.no_grad():
+            scores, _ = ner_model(fea_v)
         decoded = self.decoder.decode(scores.data, mask_v)
 
         return decoded
@@ -255,25 +256,26 @@ class predict_wc(predict):
         forw_p = torch.LongTensor( list( map( lambda t: list(itertools.accumulate( t + [1] * (word_len - len(t) ) ) ), fea_len) ) )
         back_p = torch.LongTensor( list( map( lambda t: [char_len - 1] + [ char_len - 1 - tup for tup in t[:-1] ], forw_p) ) )
 
-        masks = torch.ByteTensor(list(map(lambda t: [1] * (len(t) + 1) + [0] * (word_len - len(t) - 1), word_features)))
+        masks = get_non_pad_mask([len(t) + 1 for t in word_features], word_len)
         word_t = torch.LongTensor(list(map(lambda t: t + [self.pad_word] * (word_len - len(t)), word_features)))
 
         if self.if_cuda:
-            f_f = autograd.Variable(forw_t.transpose(0, 1)).cuda()
-            f_p = autograd.Variable(forw_p.transpose(0, 1)).cuda()
-            b_f = autograd.Variable(back_t.transpose(0, 1)).cuda()
-            b_p = autograd.Variable(back_p.transpose(0, 1)).cuda()
-            w_f = autograd.Variable(word_t.transpose(0, 1)).cuda()
-            mask_v = masks.transpose(0, 1).cuda()
+            f_f = autograd.Variable(forw_t.transpose(0, 1)).cuda().contiguous()
+            f_p = autograd.Variable(forw_p.transpose(0, 1)).cuda().contiguous()
+            b_f = autograd.Variable(back_t.transpose(0, 1)).cuda().contiguous()
+            b_p = autograd.Variable(back_p.transpose(0, 1)).cuda().contiguous()
+            w_f = autograd.Variable(word_t.transpose(0, 1)).cuda().contiguous()
+            mask_v = masks.transpose(0, 1).cuda().contiguous()
         else:
-            f_f = autograd.Variable(forw_t.transpose(0, 1))
-            f_p = autograd.Variable(forw_p.transpose(0, 1))
-            b_f = autograd.Variable(back_t.transpose(0, 1))
-            b_p = autograd.Variable(back_p.transpose(0, 1))
-            w_f = autograd.Variable(word_t.transpose(0, 1))
-            mask_v = masks.transpose(0, 1)
-
-        scores = ner_model(f_f, f_p, b_f, b_p, w_f, file_no)
+            f_f = autograd.Variable(forw_t.transpose(0, 1)).contiguous()
+            f_p = autograd.Variable(forw_p.transpose(0, 1)).contiguous()
+            b_f = autograd.Variable(back_t.transpose(0, 1)).contiguous()
+            b_p = autograd.Variable(back_p.transpose(0, 1)).contiguous()
+            w_f = autograd.Variable(word_t.transpose(0, 1)).contiguous()
+            mask_v = masks.transpose(0, 1).contiguous()
+
+        with torch.no_grad():
+            scores = ner_model(f_f, f_p, b_f, b_p, w_f, file_no)
         decoded = self.decoder.decode(scores.data, mask_v)
 
         return decoded
\ No newline at end of file
@@ -29,6 +29,8 @@ if __name__ == "__main__":
     parser.add_argument('--input_file', default='data/ner2003/test.txt', help='path to input un-annotated corpus')
     parser.add_argument('--output_file', default='annotate/output', help='path to output file')
     parser.add_argument('--dataset_no', type=int, default=5, help='number of the datasets')
+    parser.add_argument('--quantize', action='store_true', help='int8 dynamic quantization of word-level lstm, highway, crf and language model linear layers, char-level lstms stay fp32 (cpu only, i.e., --gpu -1)')
+    parser.add_argument('--cuda_streams', action='store_true', help='overlap the char-level lstms and the word embedding lookup on separate cuda streams (experimental, gpu only)')
     args = parser.parse_args()
 
 
@@ -60,6 +62,12 @@ if __name__ == "__main__":
         if_cuda = False
         packer = CRFRepack_WC(len(l_map), False)
 
+    ner_model.set_streams(args.cuda_streams and if_cuda)
+    ner_model.eval()
+    if args.quantize and not if_cuda:
+        ner_model = ner_model.inference_mode()
+    ner_model.jit_optimize()
+
     decode_label = (args.decode_type == 'label')
     predictor = predict_wc(if_cuda, f_map, c_map, l_map, f_map['<eof>'], c_map['\n'], l_map['<pad>'], l_map['<start>'], decode_label, args.batch_size, jd['caseless'])
 
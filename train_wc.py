@@ -1,4 +1,8 @@
 from __future__ import print_function
+import os
+# sentence lengths vary from batch to batch, let the cuda caching allocator grow segments instead of fragmenting them
+# (read at the first cuda allocation, so it has to be set before that)
+os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', 'expandable_segments:True')
 import datetime
 import time
 import torch
@@ -14,7 +18,6 @@ from model.predictor import predict_wc #NEW
 
 import argparse
 import json
-import os
 import sys
 from tqdm import tqdm
 import itertools
@@ -64,6 +67,9 @@ if __name__ == "__main__":
     parser.add_argument('--least_iters', type=int, default=50, help='at least train how many epochs before stop')
     parser.add_argument('--shrink_embedding', action='store_true', help='shrink the embedding dictionary to corpus (open this if pre-trained embedding dictionary is too large, but disable this may yield better results on external corpus)')
     parser.add_argument('--output_annotation', action='store_true', help='output annotation results or not')
+    parser.add_argument('--amp', action='store_true', help='use mixed precision for the lstm / highway backbone (gpu only)')
+    parser.add_argument('--amp_dtype', choices=['float16', 'bfloat16'], default='float16', help='half precision type used with --amp')
+    parser.add_argument('--cuda_streams', action='store_true', help='overlap the char-level lstms and the word embedding lookup on separate cuda streams (experimental, gpu only)')
     args = parser.parse_args()
 
     if args.gpu >= 0:
@@ -221,6 +227,11 @@ if __name__ == "__main__":
         if_cuda = False
         packer = CRFRepack_WC(len(l_map), False)
 
+    ner_model.set_amp(args.amp and if_cuda, getattr(torch, args.amp_dtype))
+    ner_model.set_streams(args.cuda_streams and if_cuda)
+    # loss scaling is only needed for float16, bfloat16 has the same exponent range as float32
+    scaler = torch.amp.GradScaler('cuda', enabled=args.amp and if_cuda and args.amp_dtype == 'float16')
+
     tot_length = sum(map(lambda t: len(t), dataset_loader))
 
     best_f1 = []
@@ -275,9 +286,11 @@ if __name__ == "__main__":
                     loss = loss + args.lambda0 * crit_lm(cfs, cf_y.view(-1))
                     cbs, _ = ner_model.word_pre_train_backward(b_f, cb_p)
                     loss = loss + args.lambda0 * crit_lm(cbs, cb_y.view(-1))
-                loss.backward()
+                scaler.scale(loss).backward()
+                scaler.unscale_(optimizer)
                 nn.utils.clip_grad_norm(ner_model.parameters(), args.clip_grad)
-                optimizer.step()
+                scaler.step(optimizer)
+                scaler.update()
         
         epoch_loss /= tot_length
 
@@ -343,6 +356,8 @@ if __name__ == "__main__":
                        dev_rec))
                 track_list.append({'loss': epoch_loss, 'dev_f1': dev_f1, 'dev_acc': dev_acc})
 
+        ner_model.release_cache()
+
         print('epoch: ' + str(args.start_epoch) + '\t in ' + str(args.epoch) + ' take: ' + str(
             time.time() - start_time) + ' s')
 